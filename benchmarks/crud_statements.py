@@ -0,0 +1,72 @@
+"""Per-call overhead of the crud reads: ORM queries vs cached lambda statements.
+
+Run from the project root against a throwaway SQLite database:
+
+    python -m benchmarks.crud_statements [--calls 5000]
+
+Both cases run on the app's session, which no longer has Flask-SQLAlchemy's
+per-table binds (`binds={}` in src/__init__.py). That change speeds up the
+ORM queries too, so the speedup shown is from statement caching alone, not
+from the whole change against the old code.
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+from src import create_app, db
+from src.api.users import crud
+from src.api.users.models import User
+
+
+# the same statements as crud's, built and compiled on every call
+
+
+def query_by_id(user_id):
+    return User.query.filter(User.id == user_id, User.deleted_at.is_(None)).first()
+
+
+def query_by_email(user_email):
+    return User.query.filter(
+        User.email == user_email, User.deleted_at.is_(None)
+    ).first()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app()
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    with app.app_context():
+        db.create_all()
+        users = [crud.add_user(f"user{i}", f"user{i}@email.com") for i in range(100)]
+        ids = [user.id for user in users]
+        emails = [user.email for user in users]
+
+        cases = [
+            ("get_user_by_id", query_by_id, crud.get_user_by_id, ids),
+            ("get_user_by_email", query_by_email, crud.get_user_by_email, emails),
+        ]
+        print("per-table binds removed for both cases")
+        print(f"{'function':<20}{'query (us)':>12}{'cached (us)':>14}{'speedup':>10}")
+        for name, before, after, values in cases:
+            timings = []
+            number = max(args.calls // len(values), 1)
+            for func in (before, after):
+                func(values[0])  # warm the statement caches
+                seconds = timeit.timeit(
+                    lambda: [func(value) for value in values], number=number
+                )
+                db.session.remove()
+                timings.append(seconds / (number * len(values)) * 1e6)
+            print(
+                f"{name:<20}{timings[0]:>12.1f}{timings[1]:>14.1f}"
+                f"{timings[0] / timings[1]:>9.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
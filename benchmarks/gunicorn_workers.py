@@ -0,0 +1,96 @@
+"""Throughput of the API under each gunicorn worker model.
+
+Starts gunicorn with gunicorn.conf.py once per worker class and hammers
+GET /users/<id> from a pool of client threads. Run from the project root:
+
+    python -m benchmarks.gunicorn_workers [--workers 2] [--clients 16] [--seconds 10]
+
+Uses DATABASE_URL if set, otherwise a throwaway SQLite database. gevent is
+skipped when it is not installed.
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PORT = 5099
+URL = f"http://127.0.0.1:{PORT}/users"
+
+
+def wait_until_up(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(URL).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def hammer(user_id, deadline):
+    done = 0
+    while time.time() < deadline:
+        urllib.request.urlopen(f"{URL}/{user_id}").read()
+        done += 1
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="2")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        FLASK_ENV="production",
+        APP_SETTINGS="src.config.ProductionConfig",
+        PORT=str(PORT),
+        GUNICORN_WORKERS=args.workers,
+    )
+    env.setdefault(
+        "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    )
+    subprocess.run([sys.executable, "manage.py", "recreate_db"], env=env, check=True)
+    subprocess.run([sys.executable, "manage.py", "seed_db"], env=env, check=True)
+
+    worker_classes = ["sync", "gthread"]
+    if importlib.util.find_spec("gevent"):
+        worker_classes.append("gevent")
+
+    print(f"{'worker class':<14}{'requests':>10}{'req/s':>10}{'req/s/worker':>14}")
+    for worker_class in worker_classes:
+        server = subprocess.Popen(
+            ["gunicorn", "--config", "gunicorn.conf.py", "manage:app"],
+            env=dict(env, GUNICORN_WORKER_CLASS=worker_class),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up()
+            deadline = time.time() + args.seconds
+            with ThreadPoolExecutor(args.clients) as pool:
+                # user ids 1 and 2 come from seed_db
+                futures = [
+                    pool.submit(hammer, i % 2 + 1, deadline)
+                    for i in range(args.clients)
+                ]
+                total = sum(future.result() for future in futures)
+        finally:
+            server.terminate()
+            server.wait()
+        rate = total / args.seconds
+        print(
+            f"{worker_class:<14}{total:>10}{rate:>10.0f}{rate / int(args.workers):>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,4 @@ done
 
 echo "Postgres started"
 
-python manage.py run -h 0.0.0.0
+exec gunicorn --config gunicorn.conf.py manage:app
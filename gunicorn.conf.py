@@ -0,0 +1,73 @@
+"""Gunicorn settings, shared by entrypoint.sh and Dockerfile.prod.
+
+Every setting can be overridden through the GUNICORN_* environment variables
+below; defaults are derived from the number of CPUs available.
+"""
+import os
+import warnings
+
+DEVELOPMENT = os.getenv("FLASK_ENV") == "development"
+# the CPUs this process may run on, which a container's cpuset can restrict
+CPUS = (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# sync: one request per process, simplest and safest for CPU-bound work.
+# gthread: a thread pool per process, cheap concurrency while waiting on I/O.
+# gevent: greenlets, for many slow clients; uses `psycogreen` so psycopg2
+# yields while waiting on Postgres.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class == "gevent":
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        warnings.warn("gevent is not installed, using gthread workers instead")
+        worker_class = "gthread"
+
+# Sync workers only serve one request at a time, so run more of them; threaded
+# and evented workers get their concurrency inside each process. WEB_CONCURRENCY
+# is the worker count hosting platforms set for the container's size.
+workers = int(
+    os.getenv("GUNICORN_WORKERS")
+    or os.getenv("WEB_CONCURRENCY")
+    or (CPUS * 2 + 1 if worker_class == "sync" else CPUS + 1)
+)
+threads = int(os.getenv("GUNICORN_THREADS", 4 if worker_class == "gthread" else 1))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = timeout
+
+# recycle workers to bound slow leaks, staggered so they don't restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+# Preloading imports the app once in the master and shares the memory with
+# forked workers; it cannot be combined with code reloading in development.
+reload = DEVELOPMENT
+preload_app = (
+    os.getenv("GUNICORN_PRELOAD", "false" if DEVELOPMENT else "true") == "true"
+)
+
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    # runs after gevent has monkey patched the worker, before it serves requests
+    if worker_class == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+
+            patch_psycopg()
+        except ImportError:
+            worker.log.warning("psycogreen is not installed, Postgres calls will block")
+
+    if worker.cfg.preload_app:
+        from src import dispose_engines
+
+        # the app was loaded in the master, which may already hold pooled
+        # connections; without preloading the worker has just loaded its own
+        dispose_engines(worker.app.wsgi())
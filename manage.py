@@ -1,7 +1,13 @@
+from datetime import timedelta
+
+import click
+from flask import current_app
 from flask.cli import FlaskGroup
 
 from src import create_app, db
-from src.api.users.models import User
+from src.api.users import sharding, stats
+from src.api.users.archive import archive_deleted_users
+from src.api.users.crud import add_user
 
 app = create_app()
 cli = FlaskGroup(create_app=create_app)
@@ -12,13 +18,49 @@ def recreate_db():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    if sharding.enabled():
+        sharding.drop_all()
+        sharding.create_all()
 
 
 @cli.command("seed_db")
 def seed_db():
-    db.session.add(User(username="adam", email="adam@email.com"))
-    db.session.add(User(username="sarah", email="sarah@email.com"))
-    db.session.commit()
+    add_user(username="adam", email="adam@email.com")
+    add_user(username="sarah", email="sarah@email.com")
+
+
+@cli.command("rebalance_shards")
+@click.option("--batch-size", default=500, show_default=True)
+def rebalance_shards(batch_size):
+    """Moves users onto the shard they belong to after shards are added."""
+    moved = sharding.rebalance(batch_size=batch_size)
+    click.echo(f"Moved {moved} rows.")
+
+
+@cli.command("rebuild_user_stats")
+def rebuild_user_stats():
+    """Recomputes the summary tables behind GET /users/stats."""
+    rows = stats.rebuild(sharding.get_session())
+    click.echo(f"Rebuilt {rows} summary rows.")
+
+
+@cli.command("archive_users")
+@click.option("--older-than-days", type=int, help="USER_ARCHIVE_AFTER_DAYS")
+@click.option("--batch-size", type=int, help="USER_ARCHIVE_BATCH_SIZE")
+@click.option("--throttle", type=float, help="USER_ARCHIVE_THROTTLE_SECONDS")
+def archive_users(older_than_days, batch_size, throttle):
+    """Moves long soft-deleted users into the archive table in batches."""
+    config = current_app.config
+    if older_than_days is None:
+        older_than_days = config["USER_ARCHIVE_AFTER_DAYS"]
+    if throttle is None:
+        throttle = config["USER_ARCHIVE_THROTTLE_SECONDS"]
+    archived = archive_deleted_users(
+        older_than=timedelta(days=older_than_days),
+        batch_size=batch_size or config["USER_ARCHIVE_BATCH_SIZE"],
+        throttle=throttle,
+    )
+    click.echo(f"Archived {archived} users.")
 
 
 if __name__ == "__main__":
@@ -5,11 +5,17 @@ from flask_admin import Admin
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from src.tracing import Tracer
+
 # instantiate the db
-db = SQLAlchemy()
+# Without per-table binds sessions go straight to the default engine instead of
+# walking every statement to find one, which would also defeat lambda caching.
+db = SQLAlchemy(session_options={"binds": {}})
 
 admin = Admin(template_mode="bootstrap3")
 
+tracer = Tracer()
+
 
 def create_app(script_info=None):
     app = Flask(__name__)
@@ -19,15 +25,31 @@ def create_app(script_info=None):
     app.config.from_object(app_settings)
 
     db.init_app(app)
+    tracer.init_app(app)
     if os.getenv("FLASK_ENV") == "development":
         admin.init_app(app)
 
     from src.api import api
+    from src.api.users import sharding
 
     api.init_app(app)
+    sharding.init_app(app)
 
     @app.shell_context_processor
     def ctx():
         return {"app": app, "db": db}
 
     return app
+
+
+def dispose_engines(app):
+    """Forgets pooled connections inherited from a parent process after a fork.
+
+    The connections are left open for the parent; the child opens its own.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+        shards = app.extensions.get("user_shards")
+        if shards is not None:
+            for engine in shards.engines.values():
+                engine.dispose(close=False)
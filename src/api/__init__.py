@@ -1,10 +1,19 @@
-from flask_restx import Api
+from flask_restx import Api, representations
 
+from src.api.metrics import metrics_namespace
 from src.api.ping import ping_namespace
 from src.api.users.views import users_namespace
+from src.tracing import span
 
 api = Api(version="1.0", title="Users Api", doc="/doc")
 
 
 api.add_namespace(ping_namespace, "/ping")
 api.add_namespace(users_namespace, "/users")
+api.add_namespace(metrics_namespace, "/metrics")
+
+
+@api.representation("application/json")
+def output_json(data, code, headers=None):
+    with span("serialize"):
+        return representations.output_json(data, code, headers)
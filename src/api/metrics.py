@@ -0,0 +1,60 @@
+from collections import Counter
+
+from flask_restx import Namespace, Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+from src import db
+from src.api.users import sharding
+
+metrics_namespace = Namespace("metrics")
+
+# per-process counts of compiled statement cache lookups, across all engines
+statement_cache = Counter()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_statement_cache(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    if context.cache_hit is CACHE_HIT:
+        statement_cache["hits"] += 1
+    elif context.cache_hit is CACHE_MISS:
+        statement_cache["misses"] += 1
+
+
+def _cache_usage(engine):
+    # Engine._compiled_cache is private; its shape is that of the pinned
+    # SQLAlchemy 1.4, so check this when upgrading
+    cache = engine._compiled_cache
+    return {
+        "size": len(cache) if cache is not None else 0,
+        "capacity": cache.capacity if cache is not None else 0,
+    }
+
+
+class Metrics(Resource):
+    def get(self):
+        """Returns compiled statement cache metrics for this process.
+
+        Hits and misses are summed over all engines, the cache usage is
+        reported per engine since each has its own cache.
+        """
+        hits, misses = statement_cache["hits"], statement_cache["misses"]
+        engines = {sharding.PRIMARY: db.engine}
+        if sharding.enabled():
+            engines.update(sharding.engines())
+        return {
+            "statement_cache": {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "engines": {
+                    name: _cache_usage(engine) for name, engine in engines.items()
+                },
+            }
+        }
+
+
+metrics_namespace.add_resource(Metrics, "")
@@ -1,9 +1,241 @@
+import logging
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import flash, g
+from flask_admin.babel import gettext
 from flask_admin.contrib.sqla import ModelView
+from flask_admin.contrib.sqla.filters import BaseSQLAFilter, FilterEqual
+from sqlalchemy import and_, func, select, text, true, tuple_, union
+
+from src import db
+from src.api.users import crud
+from src.api.users.models import User
+
+log = logging.getLogger(__name__)
+
+# the default order, also used as the keyset paging key
+KEYSET = (User.creation_date, User.id)
+
+
+def prefix_match(column, term):
+    """A case-insensitive `column starts with term`, served by the lower() index."""
+    column, term = func.lower(column), term.lower()
+    if not term:
+        return true()
+    if db.engine.dialect.name == "sqlite":
+        # SQLite only uses an index for LIKE and GLOB on a plain column, but a
+        # range on the expression can: the prefix up to its successor
+        return and_(column >= term, column < term[:-1] + chr(ord(term[-1]) + 1))
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(f"{escaped}%")
+
+
+def estimated_count():
+    """Number of live users according to the planner statistics, without a scan.
+
+    None when no statistics have been gathered: SQLite only has them after an
+    explicit ANALYZE, and counting instead would scan the table on every page.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        # the partial index only holds live users, unlike the table
+        estimate = db.session.execute(
+            text(
+                "SELECT reltuples::bigint FROM pg_class"
+                " WHERE oid = 'ix_users_live_creation_date'::regclass"
+            )
+        ).scalar()
+        # -1 until first vacuumed or analyzed, or 0 before PostgreSQL 14
+        if estimate > 0:
+            return estimate
+    if dialect == "sqlite" and db.inspect(db.engine).has_table("sqlite_stat1"):
+        # the first number of a stat row is the row count of the (partial) index
+        stat = db.session.execute(
+            text(
+                "SELECT stat FROM sqlite_stat1 WHERE idx = 'ix_users_live_creation_date'"
+            )
+        ).scalar()
+        if stat is not None:
+            return int(stat.split()[0])
+    return None
+
+
+class FilterStartsWith(BaseSQLAFilter):
+    def apply(self, query, value, alias=None):
+        return query.filter(prefix_match(self.get_column(alias), value))
+
+    def operation(self):
+        return "starts with"
 
 
 class UsersAdminView(ModelView):
+    list_template = "admin/users_list.html"
+    # the pager only links to the previous and next pages, so no COUNT(*) is
+    # needed and those links can carry keyset cursors instead of an OFFSET
+    simple_list_pager = True
     column_searchable_list = ("username", "email")
-    column_editable_list = ("username", "email", "creation_date")
-    column_filters = ("username", "email")
-    column_sortable_list = ("username", "email", "active", "creation_date")
-    column_default_sort = ("creation_date", True)
+    # crud keeps the stats for username and email changes only, and deletes
+    # go through delete_model
+    column_editable_list = ("username", "email")
+    form_excluded_columns = ("active", "creation_date", "deleted_at")
+    column_filters = (
+        FilterEqual(User.username, "Username"),
+        FilterStartsWith(User.username, "Username"),
+        FilterEqual(User.email, "Email"),
+        FilterStartsWith(User.email, "Email"),
+    )
+    column_sortable_list = ("creation_date",)
+    column_default_sort = [("creation_date", True), ("id", True)]
+
+    def get_query(self):
+        return super().get_query().filter(User.deleted_at.is_(None))
+
+    # Writes go through crud like the API's, so stats, the change feed and the
+    # sharded email index see them too.
+
+    def create_model(self, form):
+        try:
+            model = crud.add_user(form.username.data, form.email.data)
+        except Exception as ex:
+            return self._write_failed(ex, "create")
+        self.after_model_change(form, model, True)
+        return model
+
+    def update_model(self, form, model):
+        # the inline list edit submits a single field
+        username = form.username.data if "username" in form else model.username
+        email = form.email.data if "email" in form else model.email
+        try:
+            self._on_model_change(form, model, False)
+            crud.update_user(model, username, email)
+        except Exception as ex:
+            return self._write_failed(ex, "update")
+        self.after_model_change(form, model, False)
+        return True
+
+    def delete_model(self, model):
+        # soft-delete, so archival applies as well
+        try:
+            self.on_model_delete(model)
+            crud.delete_user(model)
+        except Exception as ex:
+            return self._write_failed(ex, "delete")
+        self.after_model_delete(model)
+        return True
+
+    def _write_failed(self, ex, action):
+        if not self.handle_view_exception(ex):
+            message = gettext(f"Failed to {action} record. %(error)s", error=str(ex))
+            flash(message, "error")
+            log.exception(f"Failed to {action} record.")
+        self.session.rollback()
+        return False
+
+    def search_placeholder(self):
+        return "username or email prefix"
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        term = search.strip()
+        if term:
+            # a UNION rather than OR, as SQLite can't combine two indexes on
+            # expressions for an OR
+            live = User.deleted_at.is_(None)
+            condition = User.id.in_(
+                union(
+                    select(User.id).where(live, prefix_match(User.email, term)),
+                    select(User.id).where(live, prefix_match(User.username, term)),
+                )
+            )
+            query = query.filter(condition)
+            if count_query is not None:
+                count_query = count_query.filter(condition)
+        return query, count_query, joins, count_joins
+
+    def _get_list_extra_args(self):
+        view_args = super()._get_list_extra_args()
+        g.users_admin_keyset = {"page": view_args.page}
+        for name in ("after", "before"):
+            cursor = view_args.extra_args.pop(name, None)
+            try:
+                g.users_admin_keyset[name] = cursor and _decode(cursor)
+            except ValueError:
+                # a mangled cursor falls back to OFFSET paging
+                g.users_admin_keyset[name] = None
+        return view_args
+
+    def _get_list_url(self, view_args):
+        url = super()._get_list_url(view_args)
+        keyset = g.get("users_admin_keyset")
+        if keyset is None or view_args.sort is not None:
+            return url
+        page = view_args.page or 0
+        if page == keyset["page"] + 1 and keyset.get("last"):
+            cursor = {"after": keyset["last"]}
+        elif page == keyset["page"] - 1 and page > 0 and keyset.get("first"):
+            cursor = {"before": keyset["first"]}
+        else:
+            return url
+        return f"{url}{'&' if '?' in url else '?'}{urlencode(cursor)}"
+
+    def get_list(
+        self,
+        page,
+        sort_column,
+        sort_desc,
+        search,
+        filters,
+        execute=True,
+        page_size=None,
+    ):
+        keyset = g.get("users_admin_keyset") or {}
+        keyset["active"] = execute and sort_column is None
+        count, query = super().get_list(
+            page,
+            sort_column,
+            sort_desc,
+            search,
+            filters,
+            execute=False,
+            page_size=page_size,
+        )
+        if not execute:
+            return count, query
+
+        rows = query.all()
+        if keyset["active"] and keyset.get("before"):
+            rows.reverse()
+        if rows:
+            keyset["first"] = _encode(rows[0])
+            keyset["last"] = _encode(rows[-1])
+        return count, rows
+
+    def _apply_pagination(self, query, page, page_size):
+        keyset = g.get("users_admin_keyset") or {}
+        page_size = self.page_size if page_size is None else page_size
+        if not (keyset.get("active") and page_size):
+            return super()._apply_pagination(query, page, page_size)
+
+        if keyset.get("after"):
+            query = query.filter(tuple_(*KEYSET) < keyset["after"])
+        elif keyset.get("before"):
+            # walk backwards from the cursor, get_list restores the order
+            query = query.filter(tuple_(*KEYSET) > keyset["before"])
+            query = query.order_by(None).order_by(*KEYSET)
+        elif page:
+            return super()._apply_pagination(query, page, page_size)
+        return query.limit(page_size)
+
+    def render(self, template, **kwargs):
+        if template == self.list_template:
+            kwargs["estimated_count"] = estimated_count()
+        return super().render(template, **kwargs)
+
+
+def _encode(user):
+    return f"{user.creation_date.isoformat()},{user.id}"
+
+
+def _decode(cursor):
+    creation_date, user_id = cursor.rsplit(",", 1)
+    return datetime.fromisoformat(creation_date), int(user_id)
@@ -0,0 +1,49 @@
+import time
+
+from sqlalchemy import bindparam, func, select
+
+from src import db
+from src.api.users import sharding
+from src.api.users.models import ArchivedUser, User
+
+ARCHIVED_COLUMNS = ("id", "username", "email", "active", "creation_date", "deleted_at")
+
+
+def archive_deleted_users(older_than, batch_size, throttle, sleep=time.sleep):
+    """Moves users soft-deleted before `now - older_than` into users_archive.
+
+    Each batch is copied and deleted in its own short transaction, walking the
+    partial index on deleted_at, with a `throttle` second pause between batches
+    so the job never holds locks or hogs I/O for long.
+    """
+    users, archive = User.__table__, ArchivedUser.__table__
+    columns = [users.c[name] for name in ARCHIVED_COLUMNS]
+    expired = (
+        select(users.c.id)
+        .where(users.c.deleted_at < bindparam("cutoff"))
+        .order_by(users.c.deleted_at)
+        .limit(batch_size)
+    )
+    engines = sharding.engines().values() if sharding.enabled() else [db.engine]
+
+    archived = 0
+    for engine in engines:
+        # deleted_at comes from the database clock, so the cutoff does too
+        with engine.connect() as conn:
+            cutoff = conn.execute(select(func.now())).scalar() - older_than
+        while True:
+            with engine.begin() as conn:
+                ids = conn.execute(expired, {"cutoff": cutoff}).scalars().all()
+                if ids:
+                    conn.execute(
+                        archive.insert().from_select(
+                            ARCHIVED_COLUMNS,
+                            select(*columns).where(users.c.id.in_(ids)),
+                        )
+                    )
+                    conn.execute(users.delete().where(users.c.id.in_(ids)))
+            archived += len(ids)
+            if len(ids) < batch_size:
+                break
+            sleep(throttle)
+    return archived
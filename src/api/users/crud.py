@@ -1,34 +1,148 @@
+from sqlalchemy import func, lambda_stmt, select, text
+
 from src import db
-from src.api.users.models import User
+from src.api.users import sharding, stats
+from src.tracing import traced
+
+from src.api.users.models import (  # isort:skip
+    User,
+    UserChange,
+    UserDailyStats,
+    UserDomainStats,
+)
+
+# arbitrary key for the advisory lock serialising writes to the change feed
+CHANGE_FEED_LOCK_KEY = 26
+
 
+# Reads are built with lambda_stmt: SQLAlchemy caches each lambda's statement
+# by its code location, so repeated calls skip constructing and compiling the
+# query and only extract the new parameter values.
 
+
+@traced
 def get_all_users():
-    return User.query.all()
+    statement = lambda_stmt(
+        lambda: select(User).where(User.deleted_at.is_(None)).order_by(User.id)
+    )
+    if sharding.enabled():
+        return sharding.merge_shards(sharding.get_session(), statement)
+    return db.session.execute(statement).scalars().all()
 
 
+@traced
 def get_user_by_id(user_id):
-    return User.query.filter_by(id=user_id).first()
+    statement = lambda_stmt(
+        lambda: select(User).where(User.id == user_id, User.deleted_at.is_(None))
+    )
+    return _first_on_owner(sharding.get_session(), statement, user_id)
 
 
+@traced
 def get_user_by_email(user_email):
-    return User.query.filter_by(email=user_email).first()
+    statement = lambda_stmt(
+        lambda: select(User).where(User.email == user_email, User.deleted_at.is_(None))
+    )
+    session = sharding.get_session()
+    if sharding.enabled():
+        # a single-shard query via the global email index
+        user_id = sharding.lookup_user_id(session, user_email)
+        if user_id is None:
+            return None
+        return _first_on_owner(session, statement, user_id)
+    return session.execute(statement).scalars().first()
+
+
+def _first_on_owner(session, statement, user_id):
+    bind_arguments = sharding.bind_arguments(user_id)
+    user = session.execute(statement, bind_arguments=bind_arguments).scalars().first()
+    previous = sharding.previous_bind_arguments(user_id)
+    if user is None and previous is not None:
+        # not moved by rebalance yet
+        user = session.execute(statement, bind_arguments=previous).scalars().first()
+    return user
+
+
+@traced
+def get_user_changes(since, limit):
+    statement = lambda_stmt(
+        lambda: select(UserChange)
+        .where(UserChange.id > since)
+        .order_by(UserChange.id)
+        .limit(limit)
+    )
+    return db.session.execute(statement).scalars().all()
+
+
+@traced
+def get_user_stats(start, end):
+    statement = lambda_stmt(
+        lambda: select(UserDailyStats)
+        .where(UserDailyStats.day.between(start, end), UserDailyStats.count > 0)
+        .order_by(UserDailyStats.day)
+    )
+    return db.session.execute(statement).scalars().all()
+
+
+@traced
+def get_top_domains(limit):
+    statement = lambda_stmt(
+        lambda: select(UserDomainStats)
+        .where(UserDomainStats.count > 0)
+        .order_by(UserDomainStats.count.desc(), UserDomainStats.domain)
+        .limit(limit)
+    )
+    return db.session.execute(statement).scalars().all()
+
+
+def _record_change(session, user, operation):
+    # On PostgreSQL sequence values are handed out at insert time, so two
+    # concurrent transactions could commit their changes out of order and a
+    # consumer polling with a cursor would skip the lower one. Holding a
+    # transaction-level lock until commit keeps the sequence in commit order.
+    if db.engine.dialect.name == "postgresql":
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_FEED_LOCK_KEY}
+        )
+    session.add(UserChange(user, operation))
 
 
+@traced
 def add_user(username, email):
+    session = sharding.get_session()
     user = User(username=username, email=email)
-    db.session.add(user)
-    db.session.commit()
+    if sharding.enabled():
+        sharding.allocate_id(session, user)
+    session.add(user)
+    session.flush()
+    stats.record(session, user, 1)
+    _record_change(session, user, "created")
+    session.commit()
     return user
 
 
+@traced
 def update_user(user, username, email):
+    session = sharding.get_session()
+    if stats.domain_of(email) != stats.domain_of(user.email):
+        stats.record_domain(session, user.email, -1)
+        stats.record_domain(session, email, 1)
     user.email = email
     user.username = username
-    db.session.commit()
+    if sharding.enabled():
+        sharding.reindex_email(session, user)
+    _record_change(session, user, "updated")
+    session.commit()
     return user
 
 
+@traced
 def delete_user(user):
-    db.session.delete(user)
-    db.session.commit()
+    session = sharding.get_session()
+    stats.record(session, user, -1)
+    _record_change(session, user, "deleted")
+    if sharding.enabled():
+        sharding.unindex(session, user)
+    user.deleted_at = func.now()
+    session.commit()
     return user
@@ -4,22 +4,162 @@ from sqlalchemy.sql import func
 
 from src import db
 
+# Sharded user ids are `sequence * BUCKETS + bucket`, where the sequence comes
+# from the global email index and the bucket from a stable hash of the email at
+# creation. Shards are picked by bucket, so ids survive rebalancing.
+BUCKETS = 1024
+
+# Sharded ids pass 2**31 once the sequence passes 2**21, so anything holding a
+# user id is 64 bit. SQLite integers already are, and it only autoincrements a
+# primary key declared as plain INTEGER.
+UserId = db.BigInteger().with_variant(db.Integer(), "sqlite")
+
 
 class User(db.Model):
 
     __tablename__ = "users"
 
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id = db.Column(UserId, primary_key=True, autoincrement=True)
     username = db.Column(db.String(128), nullable=False)
     email = db.Column(db.String(128), nullable=False)
     active = db.Column(db.Boolean(), default=True, nullable=False)
     creation_date = db.Column(db.DateTime, default=func.now(), nullable=False)
+    deleted_at = db.Column(db.DateTime)
+
+    # Partial indexes: reads only ever look up live users, and the archival job
+    # only scans deleted ones, so neither index carries the other's rows. The
+    # admin search matches prefixes case-insensitively on lower(); the pattern
+    # ops let PostgreSQL serve those LIKE searches from the index too.
+    __table_args__ = (
+        db.Index(
+            "ix_users_live_email",
+            email,
+            postgresql_where=deleted_at.is_(None),
+            sqlite_where=deleted_at.is_(None),
+        ),
+        db.Index(
+            "ix_users_live_username",
+            username,
+            postgresql_where=deleted_at.is_(None),
+            sqlite_where=deleted_at.is_(None),
+        ),
+        db.Index(
+            "ix_users_live_email_lower",
+            func.lower(email).label("email_lower"),
+            postgresql_ops={"email_lower": "varchar_pattern_ops"},
+            postgresql_where=deleted_at.is_(None),
+            sqlite_where=deleted_at.is_(None),
+        ),
+        db.Index(
+            "ix_users_live_username_lower",
+            func.lower(username).label("username_lower"),
+            postgresql_ops={"username_lower": "varchar_pattern_ops"},
+            postgresql_where=deleted_at.is_(None),
+            sqlite_where=deleted_at.is_(None),
+        ),
+        # the admin list's default order and keyset paging key
+        db.Index(
+            "ix_users_live_creation_date",
+            creation_date,
+            id,
+            postgresql_where=deleted_at.is_(None),
+            sqlite_where=deleted_at.is_(None),
+        ),
+        db.Index(
+            "ix_users_deleted_at",
+            deleted_at,
+            postgresql_where=deleted_at.isnot(None),
+            sqlite_where=deleted_at.isnot(None),
+        ),
+    )
 
     def __init__(self, username, email):
         self.username = username
         self.email = email
 
 
+class ArchivedUser(db.Model):
+
+    __tablename__ = "users_archive"
+
+    id = db.Column(UserId, primary_key=True, autoincrement=False)
+    username = db.Column(db.String(128), nullable=False)
+    email = db.Column(db.String(128), nullable=False)
+    active = db.Column(db.Boolean(), nullable=False)
+    creation_date = db.Column(db.DateTime, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=func.now(), nullable=False)
+
+
+class UserChange(db.Model):
+
+    __tablename__ = "user_changes"
+
+    # the primary key doubles as the change sequence consumers page over
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(UserId, nullable=False)
+    operation = db.Column(db.String(16), nullable=False)
+    username = db.Column(db.String(128))
+    email = db.Column(db.String(128))
+    active = db.Column(db.Boolean())
+    changed_at = db.Column(db.DateTime, default=func.now(), nullable=False)
+
+    def __init__(self, user, operation):
+        self.user_id = user.id
+        self.operation = operation
+        # deletes are recorded as tombstones without the user's data
+        if operation != "deleted":
+            self.username = user.username
+            self.email = user.email
+            self.active = user.active
+
+
+class UserDailyStats(db.Model):
+
+    __tablename__ = "user_daily_stats"
+
+    day = db.Column(db.Date, primary_key=True)
+    active = db.Column(db.Boolean(), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __init__(self, day, active, count):
+        self.day = day
+        self.active = active
+        self.count = count
+
+
+class UserDomainStats(db.Model):
+
+    __tablename__ = "user_domain_stats"
+
+    # all-time totals: per day they would make a date range cost
+    # O(days * domains), and company domains have a long tail
+    domain = db.Column(db.String(128), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False, index=True)
+
+    def __init__(self, domain, count):
+        self.domain = domain
+        self.count = count
+
+
+class UserEmailIndex(db.Model):
+
+    __tablename__ = "user_email_index"
+
+    # global sequence for sharded user ids, see BUCKETS
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    email = db.Column(db.String(128), nullable=False, index=True)
+    bucket = db.Column(db.Integer, nullable=False)
+
+    def __init__(self, email, bucket):
+        self.email = email
+        self.bucket = bucket
+
+    @property
+    def user_id(self):
+        return self.id * BUCKETS + self.bucket
+
+
 if os.getenv("FLASK_ENV") == "development":
     from src import admin
     from src.api.users.admin import UsersAdminView
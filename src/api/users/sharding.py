@@ -0,0 +1,222 @@
+import heapq
+import zlib
+from collections import defaultdict
+from itertools import groupby
+from operator import attrgetter
+
+from flask import current_app
+from sqlalchemy import create_engine, lambda_stmt, select
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from src import db
+from src.api.users.models import BUCKETS, ArchivedUser, User, UserEmailIndex
+
+# Only the users themselves are spread over the shards. The email index, the
+# change feed and the stats stay on the primary, so every user write also
+# writes there, and on PostgreSQL holds the change feed lock until commit:
+# sharding spreads storage and reads, but user writes are still serialised by
+# the primary. The shard and primary commits are not atomic either; a failure
+# between them can leave an index entry for a user that was never committed,
+# which allocate_id reuses when the same email is added again.
+PRIMARY = "primary"
+# a user's archived row stays on the user's shard
+SHARDED_TABLES = [User.__table__, ArchivedUser.__table__]
+
+
+def bucket_for_email(email):
+    return zlib.crc32(email.lower().encode()) % BUCKETS
+
+
+class _ShardState:
+    def __init__(self, app):
+        urls = app.config["USER_SHARDS"]
+        self.shard_ids = [f"shard{i}" for i in range(len(urls))]
+        self.previous_count = app.config.get("USER_SHARDS_PREVIOUS_COUNT")
+        self.engines = {
+            shard_id: create_engine(url) for shard_id, url in zip(self.shard_ids, urls)
+        }
+        self.session = scoped_session(
+            sessionmaker(
+                class_=ShardedSession,
+                shards=dict(self.engines, **{PRIMARY: db.get_engine(app)}),
+                shard_chooser=self._shard_chooser,
+                id_chooser=self._id_chooser,
+                execute_chooser=self._execute_chooser,
+            )
+        )
+
+    def shard_for_id(self, user_id, count=None):
+        return self.shard_ids[user_id % BUCKETS % (count or len(self.shard_ids))]
+
+    def _shard_chooser(self, mapper, instance, clause=None):
+        if mapper is not None and mapper.class_ is User:
+            return self.shard_for_id(instance.id)
+        return PRIMARY
+
+    def _id_chooser(self, query, ident):
+        if query.column_descriptions[0]["entity"] is User:
+            return [self.shard_for_id(ident[0])]
+        return [PRIMARY]
+
+    def _execute_chooser(self, orm_context):
+        mapper = orm_context.bind_mapper
+        if mapper is not None and mapper.class_ is User:
+            return self.shard_ids
+        return [PRIMARY]
+
+
+def init_app(app):
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        state = app.extensions.get("user_shards")
+        if state is not None:
+            state.session.remove()
+
+
+def enabled():
+    return bool(current_app.config.get("USER_SHARDS"))
+
+
+def _state():
+    state = current_app.extensions.get("user_shards")
+    if state is None:
+        state = current_app.extensions["user_shards"] = _ShardState(current_app)
+    return state
+
+
+def get_session():
+    """Returns the session crud should use: sharded if shards are configured."""
+    if not enabled():
+        return db.session
+    return _state().session
+
+
+def shard_ids():
+    return _state().shard_ids
+
+
+def shard_for_id(user_id):
+    return _state().shard_for_id(user_id)
+
+
+def engines():
+    return _state().engines
+
+
+def bind_arguments(user_id):
+    """Session.execute bind arguments routing to the shard owning `user_id`."""
+    if not enabled():
+        return None
+    return {"shard_id": shard_for_id(user_id)}
+
+
+def previous_bind_arguments(user_id):
+    """Bind arguments for the shard that owned `user_id` before shards were added.
+
+    None unless USER_SHARDS_PREVIOUS_COUNT is set and the owner has changed.
+    Reads that miss on the new owner retry there until rebalance has run.
+    """
+    if not enabled():
+        return None
+    state = _state()
+    if not state.previous_count:
+        return None
+    previous = state.shard_for_id(user_id, state.previous_count)
+    if previous == state.shard_for_id(user_id):
+        return None
+    return {"shard_id": previous}
+
+
+def merge_shards(session, statement):
+    """Runs a users statement on every shard, merging the id-ordered results."""
+    streams = [
+        session.execute(statement, bind_arguments={"shard_id": shard_id}).scalars()
+        for shard_id in shard_ids()
+    ]
+    merged = heapq.merge(*streams, key=attrgetter("id"))
+    # while rebalancing, a copied user is briefly on both shards
+    return [next(users) for _, users in groupby(merged, attrgetter("id"))]
+
+
+def allocate_id(session, user):
+    entry = _index_entry(session, user.email)
+    if entry is None or session.get(User, entry.user_id) is not None:
+        entry = UserEmailIndex(email=user.email, bucket=bucket_for_email(user.email))
+        session.add(entry)
+        session.flush()
+    user.id = entry.user_id
+
+
+def _index_entry(session, email):
+    statement = lambda_stmt(
+        lambda: select(UserEmailIndex).where(UserEmailIndex.email == email)
+    )
+    return session.execute(statement).scalars().first()
+
+
+def lookup_user_id(session, email):
+    entry = _index_entry(session, email)
+    return entry.user_id if entry is not None else None
+
+
+def reindex_email(session, user):
+    session.get(UserEmailIndex, user.id // BUCKETS).email = user.email
+
+
+def unindex(session, user):
+    session.query(UserEmailIndex).filter_by(id=user.id // BUCKETS).delete()
+
+
+def create_all():
+    for engine in engines().values():
+        db.Model.metadata.create_all(bind=engine, tables=SHARDED_TABLES)
+
+
+def drop_all():
+    for engine in engines().values():
+        db.Model.metadata.drop_all(bind=engine, tables=SHARDED_TABLES)
+
+
+def rebalance(batch_size=500):
+    """Moves users and their archived rows that live on the wrong shard.
+
+    Rows are copied to their new shard before being deleted from the old one,
+    replacing any copy a previous, interrupted run left there, so it is safe to
+    run again. Until it has finished, reads only find unmoved users if
+    USER_SHARDS_PREVIOUS_COUNT is set to the shard count before shards were
+    added; writes to a user in the middle of being moved can still be lost,
+    so run it while user writes are paused.
+    """
+    moved = 0
+    for table in SHARDED_TABLES:
+        moved += _rebalance_table(table, batch_size)
+    return moved
+
+
+def _rebalance_table(table, batch_size):
+    ids = shard_ids()
+    moved = 0
+    for index, shard_id in enumerate(ids):
+        source = engines()[shard_id]
+        misplaced = select(table).where(table.c.id % BUCKETS % len(ids) != index)
+        while True:
+            with source.connect() as conn:
+                rows = conn.execute(
+                    misplaced.order_by(table.c.id).limit(batch_size)
+                ).all()
+            if not rows:
+                break
+
+            targets = defaultdict(list)
+            for row in rows:
+                targets[shard_for_id(row.id)].append(dict(row._mapping))
+            for target, batch in targets.items():
+                with engines()[target].begin() as conn:
+                    batch_ids = [row["id"] for row in batch]
+                    conn.execute(table.delete().where(table.c.id.in_(batch_ids)))
+                    conn.execute(table.insert(), batch)
+            with source.begin() as conn:
+                conn.execute(table.delete().where(table.c.id.in_([r.id for r in rows])))
+            moved += len(rows)
+    return moved
@@ -0,0 +1,120 @@
+from collections import Counter, defaultdict
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src import db
+from src.api.users import sharding
+from src.api.users.models import User, UserDailyStats, UserDomainStats
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def domain_of(email):
+    return email.rpartition("@")[2].lower()
+
+
+def _add(session, model, key, delta):
+    statement = _INSERTS[db.engine.dialect.name](model).values(count=delta, **key)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={"count": model.count + statement.excluded.count},
+        )
+    )
+
+
+def record(session, user, delta):
+    """Adds `delta` to the day and domain counts `user` falls into.
+
+    Runs in the caller's transaction so the summary commits with the change.
+    """
+    day = {"day": user.creation_date.date(), "active": user.active}
+    _add(session, UserDailyStats, day, delta)
+    record_domain(session, user.email, delta)
+
+
+def record_domain(session, email, delta):
+    _add(session, UserDomainStats, {"domain": domain_of(email)}, delta)
+
+
+def _domain_expression(email):
+    """SQL for `domain_of`: the lower-cased text after the last @."""
+    if db.engine.dialect.name == "postgresql":
+        return func.lower(func.regexp_replace(email, "^.*@", ""))
+    # rtrim strips every trailing character but @, leaving the local part
+    local = func.rtrim(email, func.replace(email, "@", ""))
+    return func.lower(func.substr(email, func.length(local) + 1))
+
+
+def rebuild(session, batch_size=1000):
+    """Recomputes every summary row from the users table(s).
+
+    Runs in one transaction holding off concurrent `record` calls, which would
+    otherwise be lost between the scan and the rewrite.
+    """
+    if db.engine.dialect.name == "postgresql":
+        # conflicts with the row locks `record` takes, not with readers
+        session.execute(
+            text(
+                "LOCK TABLE user_daily_stats, user_domain_stats"
+                " IN SHARE ROW EXCLUSIVE MODE"
+            )
+        )
+    session.query(UserDailyStats).delete()
+    session.query(UserDomainStats).delete()
+
+    if not sharding.enabled():
+        live = (
+            select(
+                func.date(User.creation_date).label("day"),
+                User.active,
+                _domain_expression(User.email).label("domain"),
+            )
+            .where(User.deleted_at.is_(None))
+            .subquery()
+        )
+        rows = 0
+        for model, key in [
+            (UserDailyStats, (live.c.day, live.c.active)),
+            (UserDomainStats, (live.c.domain,)),
+        ]:
+            rows += session.execute(
+                insert(model).from_select(
+                    [column.name for column in key] + ["count"],
+                    select(*key, func.count()).group_by(*key),
+                )
+            ).rowcount
+        session.commit()
+        return rows
+
+    days, domains = Counter(), Counter()
+    query = session.query(User.creation_date, User.active, User.email).filter(
+        User.deleted_at.is_(None)
+    )
+    for shard_id in sharding.shard_ids():
+        rows = query.set_shard(shard_id).yield_per(batch_size)
+        for creation_date, active, email in rows:
+            days[creation_date.date(), active] += 1
+            domains[domain_of(email)] += 1
+
+    session.add_all(
+        UserDailyStats(day, active, count) for (day, active), count in days.items()
+    )
+    session.add_all(UserDomainStats(domain, count) for domain, count in domains.items())
+    session.commit()
+    return len(days) + len(domains)
+
+
+def summarize(days, domains):
+    counts = defaultdict(lambda: {"signups": 0, "active": 0, "inactive": 0})
+    for row in days:
+        day = counts[row.day]
+        day["signups"] += row.count
+        day["active" if row.active else "inactive"] += row.count
+    return {
+        "days": [{"day": day, **counts[day]} for day in sorted(counts)],
+        "active": sum(day["active"] for day in counts.values()),
+        "inactive": sum(day["inactive"] for day in counts.values()),
+        "domains": [{"domain": row.domain, "count": row.count} for row in domains],
+    }
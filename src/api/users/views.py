@@ -1,8 +1,16 @@
-from flask import request
-from flask_restx import Namespace, Resource, fields
+from datetime import date, timedelta
+
+from flask import current_app, request
+from flask_restx import Resource, fields, inputs
+
+from src.api.users.stats import summarize
+from src.tracing import TracedNamespace
 
 from src.api.users.crud import (  # isort:skip
     get_all_users,
+    get_user_changes,
+    get_user_stats,
+    get_top_domains,
     get_user_by_email,
     add_user,
     get_user_by_id,
@@ -10,8 +18,7 @@ from src.api.users.crud import (  # isort:skip
     delete_user,
 )
 
-
-users_namespace = Namespace("users")
+users_namespace = TracedNamespace("users")
 
 user = users_namespace.model(
     "User",
@@ -23,6 +30,64 @@ user = users_namespace.model(
     },
 )
 
+change = users_namespace.model(
+    "UserChange",
+    {
+        "sequence": fields.Integer(attribute="id"),
+        "user_id": fields.Integer,
+        "operation": fields.String,
+        "username": fields.String,
+        "email": fields.String,
+        "active": fields.Boolean,
+        "changed_at": fields.DateTime,
+    },
+)
+
+change_page = users_namespace.model(
+    "UserChangePage",
+    {
+        "changes": fields.List(fields.Nested(change)),
+        "next_cursor": fields.Integer,
+    },
+)
+
+stats = users_namespace.model(
+    "UserStats",
+    {
+        "days": fields.List(
+            fields.Nested(
+                users_namespace.model(
+                    "UserStatsDay",
+                    {
+                        "day": fields.Date,
+                        "signups": fields.Integer,
+                        "active": fields.Integer,
+                        "inactive": fields.Integer,
+                    },
+                )
+            )
+        ),
+        "active": fields.Integer,
+        "inactive": fields.Integer,
+        "domains": fields.List(
+            fields.Nested(
+                users_namespace.model(
+                    "UserStatsDomain",
+                    {"domain": fields.String, "count": fields.Integer},
+                )
+            )
+        ),
+    },
+)
+
+stats_parser = users_namespace.parser()
+stats_parser.add_argument("start", type=inputs.date, location="args")
+stats_parser.add_argument("end", type=inputs.date, location="args")
+
+changes_parser = users_namespace.parser()
+changes_parser.add_argument("since", type=inputs.natural, default=0, location="args")
+changes_parser.add_argument("limit", type=inputs.positive, location="args")
+
 
 class UserList(Resource):
     @users_namespace.marshal_with(user, as_list=True)
@@ -51,6 +116,31 @@ class UserList(Resource):
         return response_object, 201
 
 
+class UserChanges(Resource):
+    @users_namespace.expect(changes_parser)
+    @users_namespace.marshal_with(change_page)
+    def get(self):
+        """Returns user changes made after the `since` cursor."""
+        args = changes_parser.parse_args()
+        page_size = current_app.config["USER_CHANGES_PAGE_SIZE"]
+        limit = min(args["limit"] or page_size, page_size)
+        changes = get_user_changes(since=args["since"], limit=limit)
+        next_cursor = changes[-1].id if changes else args["since"]
+        return {"changes": changes, "next_cursor": next_cursor}, 200
+
+
+class UserStatistics(Resource):
+    @users_namespace.expect(stats_parser)
+    @users_namespace.marshal_with(stats)
+    def get(self):
+        """Returns daily signup counts in [start, end] and the top email domains."""
+        args = stats_parser.parse_args()
+        end = args["end"].date() if args["end"] else date.today()
+        start = args["start"].date() if args["start"] else end - timedelta(days=30)
+        domains = get_top_domains(current_app.config["USER_STATS_TOP_DOMAINS"])
+        return summarize(get_user_stats(start, end), domains), 200
+
+
 class Users(Resource):
     @users_namespace.marshal_with(user)
     @users_namespace.response(200, "Success")
@@ -102,4 +192,6 @@ class Users(Resource):
 
 
 users_namespace.add_resource(UserList, "")
+users_namespace.add_resource(UserChanges, "/changes")
+users_namespace.add_resource(UserStatistics, "/stats")
 users_namespace.add_resource(Users, "/<int:user_id>")
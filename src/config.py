@@ -5,6 +5,21 @@ class BaseConfig:
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = "my_precious"
+    USER_CHANGES_PAGE_SIZE = 100
+    USER_STATS_TOP_DOMAINS = 20
+    USER_ARCHIVE_AFTER_DAYS = 30
+    USER_ARCHIVE_BATCH_SIZE = 500
+    USER_ARCHIVE_THROTTLE_SECONDS = 0.5
+    # any object with an `export(span)` method; defaults to JSON lines in TRACING_FILE
+    TRACING_EXPORTER = None
+    TRACING_FILE = os.environ.get("TRACING_FILE")
+    # comma separated database URLs to spread users across; empty disables sharding
+    USER_SHARDS = [
+        url for url in os.environ.get("USER_SHARD_URLS", "").split(",") if url
+    ]
+    # the shard count before shards were added, until rebalance_shards has run
+    USER_SHARDS_PREVIOUS_COUNT = int(os.environ.get("USER_SHARDS_PREVIOUS_COUNT", "0"))
+    TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", "1.0"))
 
 
 class DevelopmentConfig(BaseConfig):
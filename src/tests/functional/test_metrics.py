@@ -0,0 +1,16 @@
+import json
+
+
+def test_statement_cache_metrics(test_app, test_database, add_user):
+    user = add_user("metrics", "metrics@email.com")
+    client = test_app.test_client()
+    for _ in range(3):
+        client.get(f"/users/{user.id}")
+
+    response = client.get("/metrics")
+    data = json.loads(response.data.decode())["statement_cache"]
+    assert response.status_code == 200
+    assert data["hits"] >= 2
+    assert 0 < data["hit_rate"] <= 1
+    primary = data["engines"]["primary"]
+    assert 0 < primary["size"] <= primary["capacity"]
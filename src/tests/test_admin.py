@@ -1,6 +1,13 @@
+import html
 import os
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
 
 from src import create_app, db
+from src.api.users import crud
+from src.api.users.models import User, UserChange, UserDomainStats
 
 
 def test_admin_view_dev():
@@ -16,6 +23,8 @@ def test_admin_view_dev():
         client = app.test_client()
         response = client.get("/admin/user/")
         assert response.status_code == 200
+        # no statistics gathered, so no estimate rather than a COUNT(*)
+        assert "users in total" not in response.data.decode()
     assert os.getenv("FLASK_ENV") == "development"
 
 
@@ -33,3 +42,170 @@ def test_admin_view_prod():
         resp = client.get("/admin/user/")
         assert resp.status_code == 404
     assert os.getenv("FLASK_ENV") == "production"
+
+
+def test_admin_delete_is_soft():
+    os.environ["FLASK_ENV"] = "development"
+    app = create_app()
+    app.config.from_object("src.config.TestingConfig")
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        user_id = crud.add_user("admin", "admin@email.com").id
+
+        client = app.test_client()
+        response = client.post(
+            "/admin/user/delete/", data={"id": user_id, "url": "/admin/user/"}
+        )
+        assert response.status_code == 302
+        db.session.expire_all()
+        assert db.session.get(User, user_id).deleted_at is not None
+        assert crud.get_user_by_id(user_id) is None
+        assert db.session.query(UserChange.operation).all()[-1] == ("deleted",)
+
+
+def test_admin_writes_go_through_crud():
+    os.environ["FLASK_ENV"] = "development"
+    app = create_app()
+    app.config.from_object("src.config.TestingConfig")
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        client = app.test_client()
+
+        response = client.post(
+            "/admin/user/new/",
+            data={"username": "admin", "email": "admin@x.com", "active": "y"},
+        )
+        assert response.status_code == 302
+        user_id = crud.get_user_by_email("admin@x.com").id
+
+        response = client.post(
+            "/admin/user/ajax/update/",
+            data={"list_form_pk": user_id, "email": "admin@y.com"},
+        )
+        assert response.status_code == 200
+        assert crud.get_user_by_id(user_id).email == "admin@y.com"
+        changes = crud.get_user_changes(0, 10)
+        assert [change.operation for change in changes] == ["created", "updated"]
+        assert changes[-1].email == "admin@y.com"
+        domains = dict(db.session.query(UserDomainStats.domain, UserDomainStats.count))
+        assert domains == {"x.com": 0, "y.com": 1}
+
+        # crud keeps no stats for these, so they can't be edited
+        page = client.get(f"/admin/user/edit/?id={user_id}").data.decode()
+        assert 'name="email"' in page
+        assert 'name="active"' not in page
+        assert 'name="creation_date"' not in page
+        assert 'name="deleted_at"' not in page
+
+
+def _explain(statement, parameters):
+    if db.engine.dialect.name == "postgresql":
+        rows = db.session.execute(db.text(f"EXPLAIN {statement}"), parameters)
+        plan = "\n".join(row[0] for row in rows)
+        assert "Seq Scan on users" not in plan, plan
+    else:
+        with db.engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = "\n".join(row[-1] for row in rows)
+        full_scans = [line for line in plan.splitlines() if line == "SCAN users"]
+        assert not full_scans, (statement, plan)
+    return plan
+
+
+def test_admin_view_large_table():
+    os.environ["FLASK_ENV"] = "development"
+    app = create_app()
+    app.config.from_object("src.config.TestingConfig")
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        start = datetime(2022, 1, 1)
+        db.session.execute(
+            User.__table__.insert(),
+            [
+                {
+                    "username": f"user{i}",
+                    "email": f"user{i}@email.com",
+                    "active": True,
+                    "creation_date": start + timedelta(seconds=i),
+                }
+                for i in range(20000)
+            ],
+        )
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if "FROM users" in statement:
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            client = app.test_client()
+            pages = {}
+            page = None
+            for name, url in [
+                ("first", "/admin/user/"),
+                ("second", "after"),
+                ("third", "after"),
+                ("back to second", "before"),
+                ("search", "/admin/user/?search=USER1234"),
+                ("filter", "/admin/user/?flt0_1=User1234"),
+            ]:
+                if url in ("after", "before"):
+                    link = re.search(rf'href="([^"]*{url}=[^"]*)"', page).group(1)
+                    url = html.unescape(link)
+                statements.clear()
+                response = client.get(url)
+                assert response.status_code == 200
+                page = response.data.decode()
+                pages[name] = (page, list(statements))
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+        newest = 19999
+        for name, offset in [
+            ("first", 0),
+            ("second", 20),
+            ("third", 40),
+            ("back to second", 20),
+        ]:
+            page, page_statements = pages[name]
+            assert f"user{newest - offset}@email.com" in page
+            assert f"user{newest - offset - 19}@email.com" in page
+            assert f"user{newest - offset - 20}@email.com" not in page
+            assert f"user{newest - offset + 1}@email.com" not in page
+            if offset:
+                # keyset paging rather than OFFSET (SQLite always renders OFFSET 0)
+                keyset = "(users.creation_date, users.id) "
+                assert any(keyset in sql for sql, _ in page_statements)
+        assert "~20000 users in total" in pages["first"][0]
+
+        search, _ = pages["search"]
+        assert "user12345@email.com" in search
+        assert "user2345@email.com" not in search
+        filtered, _ = pages["filter"]
+        assert "user1234@email.com" in filtered
+        assert "user12349@email.com" in filtered
+        assert "user1235@email.com" not in filtered
+
+        # only the page of rows touches users: no COUNT(*), the total is estimated
+        for _, page_statements in pages.values():
+            assert len(page_statements) == 1
+            for statement, parameters in page_statements:
+                _explain(statement, parameters)
+
+        # case-insensitive prefix searches walk the lower() indexes
+        for name, index in [
+            ("search", "ix_users_live_email_lower"),
+            ("filter", "ix_users_live_username_lower"),
+        ]:
+            [(statement, parameters)] = pages[name][1]
+            assert index in _explain(statement, parameters)
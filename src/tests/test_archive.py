@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from src.api.users import crud
+from src.api.users.archive import archive_deleted_users
+from src.api.users.models import ArchivedUser, User
+
+
+def test_delete_user_is_soft(test_app, test_database):
+    user = crud.add_user("soft", "soft@email.com")
+    user_id = user.id
+    crud.delete_user(user)
+
+    row = test_database.session.get(User, user_id)
+    assert row.deleted_at is not None
+    assert crud.get_user_by_id(user_id) is None
+    assert crud.get_user_by_email("soft@email.com") is None
+    assert user_id not in [user.id for user in crud.get_all_users()]
+
+    again = crud.add_user("soft", "soft@email.com")
+    assert crud.get_user_by_email("soft@email.com").id == again.id
+
+
+def test_archive_deleted_users(test_app, test_database):
+    session = test_database.session
+    session.query(User).delete()
+    session.query(ArchivedUser).delete()
+    live = crud.add_user("live", "live@email.com")
+    users = [crud.add_user(f"old{i}", f"old{i}@email.com") for i in range(5)]
+    recent = crud.add_user("recent", "recent@email.com")
+    for user in users + [recent]:
+        crud.delete_user(user)
+    for user in users:
+        user.deleted_at = datetime.utcnow() - timedelta(days=40)
+    session.commit()
+    old_ids = sorted(user.id for user in users)
+
+    pauses = []
+    archived = archive_deleted_users(
+        older_than=timedelta(days=30), batch_size=2, throttle=0.25, sleep=pauses.append
+    )
+    session.expire_all()
+    assert archived == 5
+    assert pauses == [0.25, 0.25]
+    assert sorted(user.id for user in session.query(ArchivedUser)) == old_ids
+    assert session.query(ArchivedUser).get(old_ids[0]).email == "old0@email.com"
+    assert sorted(user.id for user in session.query(User)) == [live.id, recent.id]
+
+    assert archive_deleted_users(timedelta(days=30), 2, 0.25, pauses.append) == 0
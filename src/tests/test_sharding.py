@@ -0,0 +1,183 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from src import create_app, db
+from src.api.users import crud, sharding, stats
+from src.api.users.archive import archive_deleted_users
+
+from src.api.users.models import (  # isort:skip
+    ArchivedUser,
+    User,
+    UserChange,
+    UserDomainStats,
+    UserEmailIndex,
+)
+
+
+@pytest.fixture(scope="function")
+def sharded_app(tmp_path):
+    def _sharded_app(shards, previous=0):
+        app = create_app()
+        app.config.from_object("src.config.TestingConfig")
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path}/primary.db"
+        app.config["USER_SHARDS"] = [
+            f"sqlite:///{tmp_path}/shard{i}.db" for i in range(shards)
+        ]
+        app.config["USER_SHARDS_PREVIOUS_COUNT"] = previous
+        return app
+
+    return _sharded_app
+
+
+def _shard_emails(shard_id, table=User.__table__):
+    with sharding.engines()[shard_id].connect() as conn:
+        return set(conn.execute(select(table.c.email)).scalars())
+
+
+def test_users_are_spread_across_shards(sharded_app):
+    app = sharded_app(3)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        emails = [f"user{i}@email.com" for i in range(30)]
+        users = [crud.add_user(username=email[:-10], email=email) for email in emails]
+
+        for user in users:
+            assert user.email in _shard_emails(sharding.shard_for_id(user.id))
+        assert all(_shard_emails(shard_id) for shard_id in sharding.shard_ids())
+        assert db.session.query(User).count() == 0
+
+        assert [user.email for user in crud.get_all_users()] == emails
+        assert crud.get_user_by_id(users[7].id).email == "user7@email.com"
+        assert crud.get_user_by_email("user12@email.com").id == users[12].id
+        assert crud.get_user_by_email("nobody@email.com") is None
+        assert crud.get_user_by_id(999) is None
+
+
+def test_update_and_delete_keep_email_index(sharded_app):
+    app = sharded_app(2)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        user = crud.add_user(username="sarah", email="sarah@email.com")
+        user_id = user.id
+
+        crud.update_user(user, "sarah", "sarah@other.com")
+        assert crud.get_user_by_email("sarah@email.com") is None
+        assert crud.get_user_by_email("sarah@other.com").id == user_id
+
+        crud.delete_user(crud.get_user_by_id(user_id))
+        assert crud.get_user_by_id(user_id) is None
+        assert crud.get_user_by_email("sarah@other.com") is None
+        operations = [change.operation for change in crud.get_user_changes(0, 10)]
+        assert operations == ["created", "updated", "deleted"]
+
+
+def test_add_user_reuses_orphaned_index_entry(sharded_app):
+    app = sharded_app(2)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        # left by an add whose shard commit failed after the primary's
+        orphan = UserEmailIndex(
+            email="retry@email.com", bucket=sharding.bucket_for_email("retry@email.com")
+        )
+        db.session.add(orphan)
+        db.session.commit()
+        orphan_user_id = orphan.user_id
+
+        user = crud.add_user("retry", "retry@email.com")
+        assert user.id == orphan_user_id
+        assert db.session.query(UserEmailIndex).count() == 1
+        assert crud.get_user_by_email("retry@email.com").id == user.id
+
+
+def test_stats_rebuild_reads_every_shard(sharded_app):
+    app = sharded_app(3)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        for i in range(12):
+            crud.add_user(f"u{i}", f"u{i}@{'odd' if i % 2 else 'even'}.com")
+        db.session.query(UserDomainStats).delete()
+        db.session.commit()
+
+        assert stats.rebuild(sharding.get_session()) == 3
+        counts = {row.domain: row.count for row in db.session.query(UserDomainStats)}
+        assert counts == {"odd.com": 6, "even.com": 6}
+
+
+def test_user_ids_past_32_bits(sharded_app):
+    for column in (User.id, ArchivedUser.id, UserChange.user_id):
+        assert column.type.compile(dialect=postgresql.dialect()) == "BIGINT"
+
+    app = sharded_app(2)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        db.session.add(UserEmailIndex(email="filler@email.com", bucket=0))
+        db.session.flush()
+        db.session.query(UserEmailIndex).update({"id": 2**21})
+        db.session.commit()
+
+        user_id = crud.add_user("big", "big@email.com").id
+        assert user_id > 2**31
+        assert crud.get_user_by_id(user_id).email == "big@email.com"
+        assert crud.get_user_by_email("big@email.com").id == user_id
+        assert crud.get_user_changes(0, 10)[-1].user_id == user_id
+
+
+def test_rebalance_after_adding_shards(sharded_app):
+    app = sharded_app(2)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        ids = [crud.add_user(f"u{i}", f"u{i}@email.com").id for i in range(40)]
+        for user_id in ids[30:]:
+            crud.delete_user(crud.get_user_by_id(user_id))
+        archive_deleted_users(timedelta(days=-1), batch_size=100, throttle=0)
+        ids, archived_ids = ids[:30], ids[30:]
+
+    app = sharded_app(4, previous=2)
+    with app.app_context():
+        sharding.create_all()
+        # reads fall back to the previous owner until users are moved
+        assert [crud.get_user_by_id(user_id).id for user_id in ids] == ids
+        assert crud.get_user_by_email("u7@email.com").id == ids[7]
+
+        # a copy left behind on the new owner by an interrupted run
+        moving = next(i for i in ids if sharding.previous_bind_arguments(i))
+        with sharding.engines()[sharding.shard_for_id(moving)].begin() as conn:
+            conn.execute(
+                User.__table__.insert(), {"id": moving, "username": "x", "email": "x"}
+            )
+
+        assert sharding.rebalance(batch_size=3) > 0
+        assert sharding.rebalance() == 0
+        for user_id in ids:
+            user = crud.get_user_by_id(user_id)
+            assert user is not None
+            assert user.email in _shard_emails(sharding.shard_for_id(user_id))
+        assert [user.id for user in crud.get_all_users()] == ids
+
+        for shard_id in sharding.shard_ids():
+            assert _shard_emails(shard_id, ArchivedUser.__table__) == {
+                f"u{i}@email.com"
+                for i, user_id in enumerate(archived_ids, start=30)
+                if sharding.shard_for_id(user_id) == shard_id
+            }
+
+
+def test_metrics_report_every_engine(sharded_app):
+    app = sharded_app(2)
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        crud.add_user("metrics", "metrics@email.com")
+        response = app.test_client().get("/metrics")
+    engines = response.get_json()["statement_cache"]["engines"]
+    assert set(engines) == {"primary", "shard0", "shard1"}
+    assert all(usage["size"] <= usage["capacity"] for usage in engines.values())
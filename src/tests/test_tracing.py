@@ -0,0 +1,97 @@
+import json
+
+from src import create_app, db, tracer
+from src.tracing import JsonLinesExporter
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def _traced_app(exporter, sample_rate=1.0):
+    app = create_app()
+    app.config.from_object("src.config.TestingConfig")
+    app.config["TRACING_EXPORTER"] = exporter
+    app.config["TRACING_SAMPLE_RATE"] = sample_rate
+    tracer.init_app(app)
+    return app
+
+
+def test_request_spans():
+    exporter = ListExporter()
+    app = _traced_app(exporter)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        response = client.post(
+            "/users",
+            data=json.dumps({"username": "trace", "email": "trace@email.com"}),
+            content_type="application/json",
+        )
+        user_id = db.session.execute(
+            db.text("SELECT id FROM users WHERE email = 'trace@email.com'")
+        ).scalar()
+        exporter.spans.clear()
+        response = client.get(f"/users/{user_id}")
+    assert response.status_code == 200
+
+    spans = {span.name: span for span in exporter.spans}
+    root = spans["GET /users/<int:user_id>"]
+    crud = spans["src.api.users.crud.get_user_by_id"]
+    assert root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+    assert response.headers["traceparent"] == root.traceparent
+    assert crud.parent_id == root.span_id
+    assert spans["sql"].parent_id == crud.span_id
+    assert "users" in spans["sql"].attributes["statement"]
+    assert spans["marshal"].parent_id == root.span_id
+    assert spans["serialize"].parent_id == root.span_id
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+
+
+def test_incoming_trace_context():
+    exporter = ListExporter()
+    app = _traced_app(exporter, sample_rate=0.0)
+    client = app.test_client()
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    parent_id = "00f067aa0ba902b7"
+
+    client.get("/ping", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    assert [span.name for span in exporter.spans] == ["serialize", "GET /ping"]
+    assert exporter.spans[1].trace_id == trace_id
+    assert exporter.spans[1].parent_id == parent_id
+
+    exporter.spans.clear()
+    client.get("/ping", headers={"traceparent": f"00-{trace_id}-{parent_id}-00"})
+    client.get("/ping")
+    assert exporter.spans == []
+
+
+def test_tracing_state_is_per_app():
+    first, second = ListExporter(), ListExporter()
+    first_app = _traced_app(first)
+    second_app = _traced_app(second, sample_rate=0.0)
+
+    first_app.test_client().get("/ping")
+    second_app.test_client().get("/ping")
+    assert [span.name for span in first.spans] == ["serialize", "GET /ping"]
+    assert second.spans == []
+    assert first_app.extensions["tracing"].exporter is first
+    assert second_app.extensions["tracing"].sample_rate == 0.0
+
+
+def test_json_lines_exporter(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    app = _traced_app(JsonLinesExporter(str(path)))
+    client = app.test_client()
+    client.get("/ping")
+    client.get("/ping")
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["serialize", "GET /ping"] * 2
+    assert lines[0]["parent_id"] == lines[1]["span_id"]
+    assert lines[1]["duration_ms"] >= 0
@@ -1,5 +1,5 @@
 import json
-from datetime import datetime
+from datetime import date, datetime
 
 import pytest
 
@@ -264,3 +264,100 @@ def test_update_user_duplicate_email(test_app, monkeypatch):
     data = json.loads(resp.data.decode())
     assert resp.status_code == 409
     assert "Sorry. That email already exists." in data["message"]
+
+
+def test_user_changes(test_app, monkeypatch):
+    class AttrDict(dict):
+        def __init__(self, *args, **kwargs):
+            super(AttrDict, self).__init__(*args, **kwargs)
+            self.__dict__ = self
+
+    def mock_get_user_changes(since, limit):
+        assert since == 5
+        assert limit == 2
+        created = AttrDict()
+        created.update(
+            {"id": 6, "user_id": 1, "operation": "created", "email": "a@email.com"}
+        )
+        deleted = AttrDict()
+        deleted.update({"id": 7, "user_id": 1, "operation": "deleted", "email": None})
+        return [created, deleted]
+
+    monkeypatch.setattr(views, "get_user_changes", mock_get_user_changes)
+    client = test_app.test_client()
+    response = client.get("/users/changes?since=5&limit=2")
+    data = json.loads(response.data.decode())
+    assert response.status_code == 200
+    assert [change["sequence"] for change in data["changes"]] == [6, 7]
+    assert data["changes"][1]["email"] is None
+    assert data["next_cursor"] == 7
+
+
+def test_user_changes_empty(test_app, monkeypatch):
+    def mock_get_user_changes(since, limit):
+        assert limit == test_app.config["USER_CHANGES_PAGE_SIZE"]
+        return []
+
+    monkeypatch.setattr(views, "get_user_changes", mock_get_user_changes)
+    client = test_app.test_client()
+    response = client.get("/users/changes?since=42&limit=100000")
+    data = json.loads(response.data.decode())
+    assert response.status_code == 200
+    assert data["changes"] == []
+    assert data["next_cursor"] == 42
+
+
+def test_user_stats(test_app, monkeypatch):
+    class AttrDict(dict):
+        def __init__(self, *args, **kwargs):
+            super(AttrDict, self).__init__(*args, **kwargs)
+            self.__dict__ = self
+
+    def mock_get_user_stats(start, end):
+        assert start == date(2022, 5, 1)
+        assert end == date(2022, 5, 2)
+        rows = [
+            (date(2022, 5, 1), True, 3),
+            (date(2022, 5, 1), False, 1),
+            (date(2022, 5, 2), True, 2),
+        ]
+        return [
+            AttrDict(day=day, active=active, count=count) for day, active, count in rows
+        ]
+
+    def mock_get_top_domains(limit):
+        assert limit == test_app.config["USER_STATS_TOP_DOMAINS"]
+        return [
+            AttrDict(domain="email.com", count=4),
+            AttrDict(domain="other.com", count=2),
+        ]
+
+    monkeypatch.setattr(views, "get_user_stats", mock_get_user_stats)
+    monkeypatch.setattr(views, "get_top_domains", mock_get_top_domains)
+    client = test_app.test_client()
+    response = client.get("/users/stats?start=2022-05-01&end=2022-05-02")
+    data = json.loads(response.data.decode())
+    assert response.status_code == 200
+    assert data["days"] == [
+        {"day": "2022-05-01", "signups": 4, "active": 3, "inactive": 1},
+        {"day": "2022-05-02", "signups": 2, "active": 2, "inactive": 0},
+    ]
+    assert data["active"] == 5
+    assert data["inactive"] == 1
+    assert data["domains"] == [
+        {"domain": "email.com", "count": 4},
+        {"domain": "other.com", "count": 2},
+    ]
+
+
+def test_user_stats_invalid_date(test_app):
+    client = test_app.test_client()
+    response = client.get("/users/stats?start=yesterday")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("query", ["limit=-1", "limit=0", "since=-5"])
+def test_user_changes_invalid_args(test_app, query):
+    client = test_app.test_client()
+    response = client.get(f"/users/changes?{query}")
+    assert response.status_code == 400
@@ -2,6 +2,7 @@ import json
 
 import pytest
 
+from src.api.users import stats
 from src.api.users.models import User
 
 
@@ -179,3 +180,115 @@ def test_update_user_duplicate_email(test_app, test_database, add_user):
     data = json.loads(resp.data.decode())
     assert resp.status_code == 409
     assert "Sorry. That email already exists." in data["message"]
+
+
+def test_user_changes(test_app, test_database):
+    client = test_app.test_client()
+    response = client.get("/users/changes")
+    since = json.loads(response.data.decode())["next_cursor"]
+
+    client.post(
+        "/users",
+        data=json.dumps({"username": "john", "email": "john@email.com"}),
+        content_type="application/json",
+    )
+    user = User.query.filter_by(email="john@email.com").first()
+    client.put(
+        f"/users/{user.id}",
+        data=json.dumps({"username": "johnny", "email": "johnny@email.com"}),
+        content_type="application/json",
+    )
+    client.delete(f"/users/{user.id}")
+
+    response = client.get(f"/users/changes?since={since}")
+    data = json.loads(response.data.decode())
+    assert response.status_code == 200
+    changes = data["changes"]
+    assert [change["operation"] for change in changes] == [
+        "created",
+        "updated",
+        "deleted",
+    ]
+    assert all(change["user_id"] == user.id for change in changes)
+    assert changes[0]["email"] == "john@email.com"
+    assert changes[1]["username"] == "johnny"
+    assert changes[2]["email"] is None
+    assert data["next_cursor"] == changes[-1]["sequence"]
+
+    response = client.get(f"/users/changes?since={data['next_cursor']}")
+    data = json.loads(response.data.decode())
+    assert data["changes"] == []
+    assert data["next_cursor"] == changes[-1]["sequence"]
+
+
+def test_user_changes_paginated(test_app, test_database):
+    client = test_app.test_client()
+    response = client.get("/users/changes")
+    since = json.loads(response.data.decode())["next_cursor"]
+    for name in ("anna", "bob", "carl"):
+        client.post(
+            "/users",
+            data=json.dumps({"username": name, "email": f"{name}@email.com"}),
+            content_type="application/json",
+        )
+
+    response = client.get(f"/users/changes?since={since}&limit=2")
+    data = json.loads(response.data.decode())
+    assert [change["username"] for change in data["changes"]] == ["anna", "bob"]
+
+    response = client.get(f"/users/changes?since={data['next_cursor']}&limit=2")
+    data = json.loads(response.data.decode())
+    assert [change["username"] for change in data["changes"]] == ["carl"]
+
+
+def _stats_domain(client, domain):
+    response = client.get("/users/stats?start=2000-01-01&end=2100-01-01")
+    data = json.loads(response.data.decode())
+    counts = {entry["domain"]: entry["count"] for entry in data["domains"]}
+    return counts.get(domain, 0), data
+
+
+def test_user_stats(test_app, test_database):
+    client = test_app.test_client()
+    for name in ("ann", "ben"):
+        client.post(
+            "/users",
+            data=json.dumps({"username": name, "email": f"{name}@stats.com"}),
+            content_type="application/json",
+        )
+    count, data = _stats_domain(client, "stats.com")
+    assert count == 2
+    assert data["days"][-1]["signups"] >= 2
+    assert data["active"] == sum(day["active"] for day in data["days"])
+
+    user = User.query.filter_by(email="ann@stats.com").first()
+    client.put(
+        f"/users/{user.id}",
+        data=json.dumps({"username": "ann", "email": "ann@moved.com"}),
+        content_type="application/json",
+    )
+    assert _stats_domain(client, "stats.com")[0] == 1
+    assert _stats_domain(client, "moved.com")[0] == 1
+
+    client.delete(f"/users/{user.id}")
+    assert _stats_domain(client, "moved.com")[0] == 0
+
+
+def test_user_stats_rebuild(test_app, test_database, add_user):
+    test_database.session.query(User).delete()
+    add_user("carl", "carl@rebuild.com")
+    add_user("dora", "dora@rebuild.com")
+    add_user("eve", "eve@elsewhere.com")
+    add_user("fay", '"fay@home"@ReBuild.com')
+
+    # one day and two domains
+    assert stats.rebuild(test_database.session) == 3
+    client = test_app.test_client()
+    count, data = _stats_domain(client, "rebuild.com")
+    assert count == 3
+    assert data["domains"] == [
+        {"domain": "rebuild.com", "count": 3},
+        {"domain": "elsewhere.com", "count": 1},
+    ]
+    assert data["active"] == 4
+    assert data["inactive"] == 0
@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import runpy
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import src
+
+CONFIG = str(Path(__file__).parents[3] / "gunicorn.conf.py")
+
+
+def _load(monkeypatch, **env):
+    for name in (
+        "FLASK_ENV",
+        "GUNICORN_WORKERS",
+        "GUNICORN_THREADS",
+        "GUNICORN_WORKER_CLASS",
+        "WEB_CONCURRENCY",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return runpy.run_path(CONFIG)
+
+
+@pytest.mark.parametrize(
+    "worker_class, threads, workers",
+    [
+        ["sync", 1, lambda cpus: cpus * 2 + 1],
+        ["gthread", 4, lambda cpus: cpus + 1],
+    ],
+)
+def test_worker_model(monkeypatch, worker_class, threads, workers):
+    config = _load(monkeypatch, GUNICORN_WORKER_CLASS=worker_class)
+    assert config["worker_class"] == worker_class
+    assert config["threads"] == threads
+    assert config["CPUS"] == len(os.sched_getaffinity(0))
+    assert config["workers"] == workers(config["CPUS"])
+    assert config["max_requests_jitter"] == config["max_requests"] // 10
+    assert config["preload_app"]
+    assert not config["reload"]
+
+
+def test_env_overrides(monkeypatch):
+    config = _load(monkeypatch, GUNICORN_WORKERS="3", GUNICORN_THREADS="8", PORT="8000")
+    assert config["workers"] == 3
+    assert config["threads"] == 8
+    assert config["bind"] == "0.0.0.0:8000"
+
+
+def test_development_reloads_without_preload(monkeypatch):
+    config = _load(monkeypatch, FLASK_ENV="development")
+    assert config["reload"]
+    assert not config["preload_app"]
+
+
+def test_web_concurrency(monkeypatch):
+    assert _load(monkeypatch, WEB_CONCURRENCY="5")["workers"] == 5
+    config = _load(monkeypatch, WEB_CONCURRENCY="5", GUNICORN_WORKERS="2")
+    assert config["workers"] == 2
+
+
+@pytest.mark.skipif(importlib.util.find_spec("gevent") is not None, reason="gevent")
+def test_gevent_fallback_warns(monkeypatch):
+    with pytest.warns(UserWarning, match="gevent is not installed"):
+        config = _load(monkeypatch, GUNICORN_WORKER_CLASS="gevent")
+    assert config["worker_class"] == "gthread"
+
+
+@pytest.mark.parametrize("preload", [True, False])
+def test_post_worker_init_disposes_preloaded_engines(monkeypatch, preload):
+    disposed = []
+    monkeypatch.setattr(src, "dispose_engines", disposed.append)
+    app = object()
+    worker = SimpleNamespace(
+        cfg=SimpleNamespace(preload_app=preload),
+        app=SimpleNamespace(wsgi=lambda: app),
+    )
+    _load(monkeypatch)["post_worker_init"](worker)
+    assert disposed == ([app] if preload else [])
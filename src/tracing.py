@@ -0,0 +1,215 @@
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import current_app, g, request
+from flask_restx import Namespace
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, trace_id, exporter, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.exporter = exporter
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.end = None
+        self._token = None
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": (self.end - self.start) * 1000,
+            "attributes": self.attributes,
+        }
+
+
+class JsonLinesExporter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+def _activate(span):
+    span._token = _current_span.set(span)
+    return span
+
+
+def start_span(name, **attributes):
+    """Starts a child of the current span, or returns None when not tracing."""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    span = Span(name, parent.trace_id, parent.exporter, parent.span_id, attributes)
+    return _activate(span)
+
+
+def end_span(span, error=None):
+    if span is None:
+        return
+    span.end = time.time()
+    if error is not None:
+        span.attributes["error"] = repr(error)
+    _current_span.reset(span._token)
+    span.exporter.export(span)
+
+
+@contextmanager
+def span(name, **attributes):
+    current = start_span(name, **attributes)
+    try:
+        yield current
+    except Exception as e:
+        end_span(current, error=e)
+        raise
+    else:
+        end_span(current)
+
+
+def traced(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(f"{func.__module__}.{func.__name__}"):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class TracedNamespace(Namespace):
+    """A Namespace whose `marshal_with` records marshalling in its own span."""
+
+    def marshal_with(self, fields, *args, **kwargs):
+        marshal = super().marshal_with(fields, *args, **kwargs)
+
+        def decorator(func):
+            @wraps(func)
+            def handler(*args, **kwargs):
+                result = func(*args, **kwargs)
+                # ended by `wrapper` once marshalling has returned
+                start_span("marshal")
+                return result
+
+            marshalled = marshal(handler)
+
+            @wraps(marshalled)
+            def wrapper(*args, **kwargs):
+                parent = _current_span.get()
+                try:
+                    return marshalled(*args, **kwargs)
+                finally:
+                    current = _current_span.get()
+                    if current is not parent and current.name == "marshal":
+                        end_span(current)
+
+            return wrapper
+
+        return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._tracing_span = start_span("sql", statement=statement)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    end_span(getattr(context, "_tracing_span", None))
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if context is not None:
+        end_span(
+            getattr(context, "_tracing_span", None),
+            error=exception_context.original_exception,
+        )
+
+
+class _TracingState:
+    def __init__(self, app):
+        self.exporter = app.config.get("TRACING_EXPORTER")
+        if self.exporter is None and app.config.get("TRACING_FILE"):
+            self.exporter = JsonLinesExporter(app.config["TRACING_FILE"])
+        self.sample_rate = app.config.get("TRACING_SAMPLE_RATE", 1.0)
+
+
+class Tracer:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = app.extensions["tracing"] = _TracingState(app)
+        if state.exporter is None:
+            return
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_response)
+        app.teardown_request(self._end_request)
+
+    def _sampled_root(self):
+        state = current_app.extensions["tracing"]
+        match = TRACEPARENT_RE.match(request.headers.get(TRACEPARENT_HEADER, ""))
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            if not int(flags, 16) & 1:
+                return None
+        else:
+            if random.random() >= state.sample_rate:
+                return None
+            trace_id, parent_id = secrets.token_hex(16), None
+        return Span(
+            f"{request.method} {request.url_rule or request.path}",
+            trace_id,
+            state.exporter,
+            parent_id,
+            {"http.method": request.method, "http.target": request.full_path},
+        )
+
+    def _start_request(self):
+        root = self._sampled_root()
+        if root is not None:
+            g.tracing_span = _activate(root)
+
+    def _finish_response(self, response):
+        root = g.get("tracing_span")
+        if root is not None:
+            root.attributes["http.status_code"] = response.status_code
+            response.headers[TRACEPARENT_HEADER] = root.traceparent
+        return response
+
+    def _end_request(self, error=None):
+        root = g.pop("tracing_span", None)
+        if root is not None:
+            end_span(root, error=error)